@@ -5,21 +5,64 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent.parent / "treeparse" / "src"))
 from treeparse import cli, command, argument, option, group
-import ruamel.yaml as yaml  # Switched from PyYAML to ruamel.yaml
+import yaml
 from rich.console import Console
 from rich.syntax import Syntax
-from .file_utils import extract_text, anonymize_file, md_to_typst
-from .core.anonymizer import Anonymizer
+from .file_utils import (
+    BUFFER_SIZE,
+    extract_text,
+    anonymize_file,
+    md_to_typst,
+    write_text_atomic,
+)
 import re
 import random
 
+# Entity labels in the order they are reported
+ENTITY_LABELS = (
+    "PERSON",
+    "EMAIL_ADDRESS",
+    "LOCATION",
+    "PHONE_NUMBER",
+    "DATE_NUMBER",
+    "ID_NUMBER",
+    "CODE_NUMBER",
+    "GENERAL_NUMBER",
+)
+
+
+def _print_counts(counts: dict, action: str):
+    """Print per-entity counts for the given action ("found" or "replaced")."""
+    for label in ENTITY_LABELS:
+        print(f"  {label} {action}: {counts[f'{label.lower()}_{action}']}")
+
+
+def _load_anonymizer(config):
+    """Create an Anonymizer with replacements loaded from a YAML config file."""
+    # Imported lazily so that `did --help` does not pay the Presidio/spaCy import
+    from .core.anonymizer import Anonymizer, load_yaml
+
+    anonymizer = Anonymizer()
+    with open(config, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
+        config_data = load_yaml(f) or {}
+    anonymizer.load_replacements(config_data)
+    return anonymizer
+
 
-def extract(files, config, language):
+def extract(files, config, language, no_cache, jobs, model, device):
     """Extract entities from text files and generate YAML config."""
+    from .core.anonymizer import Anonymizer, DEFAULT_CACHE_DIR
+
     if not files:
         print("Error: At least one input file is required.")
         sys.exit(1)
-    anonymizer = Anonymizer(language=language)
+    anonymizer = Anonymizer(
+        language=language,
+        cache_dir=None if no_cache else DEFAULT_CACHE_DIR,
+        n_process=jobs,
+        model=model,
+        device=device,
+    )
     console = Console()
     try:
         print("=" * 20)
@@ -37,23 +80,20 @@ def extract(files, config, language):
             anonymizer.detect_entities(texts)
 
         print("Detected entities:")
-        print(f"  PERSON found: {anonymizer.counts['person_found']}")
-        print(f"  EMAIL_ADDRESS found: {anonymizer.counts['email_address_found']}")
-        print(f"  LOCATION found: {anonymizer.counts['location_found']}")
-        print(f"  PHONE_NUMBER found: {anonymizer.counts['phone_number_found']}")
-        print(f"  DATE_NUMBER found: {anonymizer.counts['date_number_found']}")
-        print(f"  ID_NUMBER found: {anonymizer.counts['id_number_found']}")
-        print(f"  CODE_NUMBER found: {anonymizer.counts['code_number_found']}")
-        print(f"  GENERAL_NUMBER found: {anonymizer.counts['general_number_found']}")
-
-        yaml_str = anonymizer.generate_yaml()
-        print("Writing YAML config...")
-        with open(config, "w") as f:
-            f.write(yaml_str)
+        _print_counts(anonymizer.counts, "found")
+
+        # JSON is a subset of YAML, so a .json config loads like any other
+        lexer = "json" if Path(config).suffix == ".json" else "yaml"
+        if lexer == "json":
+            yaml_str = anonymizer.generate_json()
+        else:
+            yaml_str = anonymizer.generate_yaml()
+        print(f"Writing {lexer.upper()} config...")
+        write_text_atomic(Path(config), yaml_str)
 
         print(f"Config written to {config}")
 
-        syntax = Syntax(yaml_str, "yaml")
+        syntax = Syntax(yaml_str, lexer)
         console.print(syntax)
 
         print("=" * 20)
@@ -74,7 +114,6 @@ def plain(file, config, output):
     if config is None:
         print("Error: --config is required")
         sys.exit(1)
-    anonymizer = Anonymizer()
     input_path = Path(file)
     if output is None:
         output = str(
@@ -84,26 +123,16 @@ def plain(file, config, output):
     try:
         print("=" * 20)
         print("Loading config...")
-        yaml_obj = yaml.YAML()  # Use ruamel.yaml YAML object for loading
-        with open(config, "r") as f:
-            config_data = yaml_obj.load(f) or {}
-        anonymizer.load_replacements(config_data)
+        anonymizer = _load_anonymizer(config)
 
         print(f"Processing {file}...")
         counts = anonymize_file(input_path, anonymizer, output_path)
 
         print("Replacement counts:")
-        print(f"  PERSON replaced: {counts['person_replaced']}")
-        print(f"  EMAIL_ADDRESS replaced: {counts['email_address_replaced']}")
-        print(f"  LOCATION replaced: {counts['location_replaced']}")
-        print(f"  PHONE_NUMBER replaced: {counts['phone_number_replaced']}")
-        print(f"  DATE_NUMBER replaced: {counts['date_number_replaced']}")
-        print(f"  ID_NUMBER replaced: {counts['id_number_replaced']}")
-        print(f"  CODE_NUMBER replaced: {counts['code_number_replaced']}")
-        print(f"  GENERAL_NUMBER replaced: {counts['general_number_replaced']}")
+        _print_counts(counts, "replaced")
 
         console = Console()
-        with open(output_path, "r", encoding="utf-8") as f:
+        with open(output_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             content = f.read()
             if output_path.suffix == ".md":
                 syntax = Syntax(content, "markdown", theme="monokai")
@@ -126,10 +155,11 @@ def plain(file, config, output):
 
 def typst(file, config, output):
     """Pseudonymize to Typst files."""
+    from .core.anonymizer import compile_variants, match_entry
+
     if config is None:
         print("Error: --config is required")
         sys.exit(1)
-    anonymizer = Anonymizer()
     input_path = Path(file)
     if output is None:
         output = str(input_path.with_suffix(".typ"))
@@ -144,10 +174,7 @@ def typst(file, config, output):
     try:
         print("=" * 20)
         print("Loading config...")
-        yaml_obj = yaml.YAML()  # Use ruamel.yaml YAML object for loading
-        with open(config, "r") as f:
-            config_data = yaml_obj.load(f) or {}
-        anonymizer.load_replacements(config_data)
+        anonymizer = _load_anonymizer(config)
 
         print(f"Processing {file}...")
 
@@ -166,21 +193,11 @@ def typst(file, config, output):
             "code_number": 0,
             "general_number": 0,
         }
-        category_mapping = {
-            "person": "person_replaced",
-            "email_address": "email_address_replaced",
-            "location": "location_replaced",
-            "phone_number": "phone_number_replaced",
-            "date_number": "date_number_replaced",
-            "id_number": "id_number_replaced",
-            "code_number": "code_number_replaced",
-            "general_number": "general_number_replaced",
-        }
         typst_mappings = {}  # var -> real_value
         fake_mappings = {}  # var -> fake_value
         counts = {k: 0 for k in anonymizer.counts}
         text = extract_text(input_path)
-        all_replacements = []  # (variant, pattern, repl, cat, pat)
+        replacements = {}  # (variant, needs word boundaries) -> (repl, cat)
 
         def generate_fake_digits(length):
             return "".join(
@@ -255,83 +272,62 @@ def typst(file, config, output):
                         fake_var = "<FAKE>"
                     fake_mappings[var] = fake_var
 
-                    # Prepare replacement
-                    repl = f"#({var})"
-                    escaped = re.escape(variant)
-                    if (
-                        cat
-                        in [
-                            "person",
-                            "phone_number",
-                            "date_number",
-                            "id_number",
-                            "code_number",
-                            "general_number",
-                        ]
-                        and "\n" in variant
-                    ):
-                        pattern = escaped
-                    elif cat == "location":
-                        pattern = escaped
-                    else:
-                        pattern = r"\b" + escaped + r"\b"
-                    all_replacements.append(
-                        (
-                            variant,
-                            pattern,
-                            repl,
-                            cat,
-                            entity.pattern if cat in number_cats else None,
+                    # Prepare replacement; the first entity listing a variant
+                    # keeps it, except that a later bare entry still replaces
+                    # the in-word occurrences a bounded one skips
+                    if not variant or (variant, False) in replacements:
+                        continue
+                    word_bounded = not (
+                        cat == "location"
+                        or (
+                            cat
+                            in [
+                                "person",
+                                "phone_number",
+                                "date_number",
+                                "id_number",
+                                "code_number",
+                                "general_number",
+                            ]
+                            and "\n" in variant
                         )
                     )
+                    replacements.setdefault((variant, word_bounded), (f"#({var})", cat))
 
-        # Sort replacements by variant length descending
-        sorted_replacements = sorted(
-            all_replacements, key=lambda x: len(x[0]), reverse=True
-        )
+        # Apply all replacements in one longest-match-first pass
+        pattern = compile_variants(replacements)
 
-        # Apply replacements
-        for variant, pattern, repl, cat, pat in sorted_replacements:
-            count = len(re.findall(pattern, text))
-            replaced_key = category_mapping[cat]
-            found_key = replaced_key.replace("_replaced", "_found")
-            counts[found_key] += count
-            counts[replaced_key] += count
-            text = re.sub(pattern, repl, text)
+        def replace(match):
+            repl, cat = replacements[match_entry(match, replacements)]
+            counts[f"{cat}_found"] += 1
+            counts[f"{cat}_replaced"] += 1
+            return repl
 
+        if pattern is not None:
+            text = pattern.sub(replace, text)
         anonymized_text = text
 
         parent.mkdir(parents=True, exist_ok=True)
 
-        # Write vars.typ
-        with open(vars_path, "w", encoding="utf-8") as f:
-            for var, val in typst_mappings.items():
-                escaped = val.replace("\\", "\\\\").replace('"', '\\"')
-                f.write(f'#let {var} = "{escaped}"\n')
-
-        # Write fakevars.typ
-        with open(fake_path, "w", encoding="utf-8") as f:
-            for var, val in fake_mappings.items():
+        def typst_vars(mappings):
+            lines = []
+            for var, val in mappings.items():
                 escaped = val.replace("\\", "\\\\").replace('"', '\\"')
-                f.write(f'#let {var} = "{escaped}"\n')
-
-        # Write main.typ
-        with open(main_path, "w", encoding="utf-8") as f:
-            f.write(f'#import "{vars_path.name}": *\n\n')
-            if input_path.suffix == ".md":
-                f.write(md_to_typst(anonymized_text))
-            else:
-                f.write(anonymized_text)
+                lines.append(f'#let {var} = "{escaped}"\n')
+            return "".join(lines)
+
+        # Write vars.typ, fakevars.typ and main.typ
+        write_text_atomic(vars_path, typst_vars(typst_mappings))
+        write_text_atomic(fake_path, typst_vars(fake_mappings))
+        body = (
+            md_to_typst(anonymized_text)
+            if input_path.suffix == ".md"
+            else anonymized_text
+        )
+        write_text_atomic(main_path, f'#import "{vars_path.name}": *\n\n' + body)
 
         print("Replacement counts:")
-        print(f"  PERSON replaced: {counts['person_replaced']}")
-        print(f"  EMAIL_ADDRESS replaced: {counts['email_address_replaced']}")
-        print(f"  LOCATION replaced: {counts['location_replaced']}")
-        print(f"  PHONE_NUMBER replaced: {counts['phone_number_replaced']}")
-        print(f"  DATE_NUMBER replaced: {counts['date_number_replaced']}")
-        print(f"  ID_NUMBER replaced: {counts['id_number_replaced']}")
-        print(f"  CODE_NUMBER replaced: {counts['code_number_replaced']}")
-        print(f"  GENERAL_NUMBER replaced: {counts['general_number_replaced']}")
+        _print_counts(counts, "replaced")
 
         console = Console()
         print(f"\nTypst files written to {main_path.parent}")
@@ -340,19 +336,19 @@ def typst(file, config, output):
         print(f" - {fake_path}")
 
         print(f"\nPreview of {vars_path.name}:")
-        with open(vars_path, "r", encoding="utf-8") as f:
+        with open(vars_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             vars_content = f.read()
         syntax = Syntax(vars_content, "rust")
         console.print(syntax)
 
         print(f"\nPreview of {fake_path.name}:")
-        with open(fake_path, "r", encoding="utf-8") as f:
+        with open(fake_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             fake_content = f.read()
         syntax = Syntax(fake_content, "rust")
         console.print(syntax)
 
         print(f"\nPreview of {main_path.name}:")
-        with open(main_path, "r", encoding="utf-8") as f:
+        with open(main_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             main_content = f.read()
         syntax = Syntax(main_content, "rust")
         console.print(syntax)
@@ -401,6 +397,33 @@ extract_cmd = command(
             help="Language for entity detection (e.g., 'en', 'da')",
             sort_key=1,
         ),
+        option(
+            flags=["--no-cache"],
+            flag=True,
+            help="Re-run detection instead of reusing cached results",
+            sort_key=2,
+        ),
+        option(
+            flags=["--jobs", "-j"],
+            arg_type=int,
+            default=1,
+            help="Number of processes spaCy uses for entity detection (-1: all CPUs)",
+            sort_key=3,
+        ),
+        option(
+            flags=["--model", "-m"],
+            arg_type=str,
+            help="spaCy model to use instead of the default for the language",
+            sort_key=4,
+        ),
+        option(
+            flags=["--device", "-d"],
+            arg_type=str,
+            default="auto",
+            choices=["auto", "gpu", "cpu"],
+            help="Run spaCy on the GPU when available (auto), always (gpu) or never (cpu)",
+            sort_key=5,
+        ),
     ],
 )
 app.commands.append(extract_cmd)
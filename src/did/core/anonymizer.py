@@ -1,278 +1,611 @@
 """Anonymizer class for entity detection and anonymization."""
 
+import os
 import re
+import tempfile
+import threading
 import io  # Added for StringIO
-from ruamel.yaml import YAML  # Explicitly using ruamel.yaml
-from ruamel.yaml.scalarstring import DoubleQuotedScalarString  # For quoting strings
+import hashlib
+import json
+from bisect import bisect_right, insort
+from functools import cached_property, lru_cache
+from operator import attrgetter, itemgetter
+from pathlib import Path
+import yaml
+import spacy
 from presidio_analyzer import (
     AnalyzerEngine,
     PatternRecognizer,
     Pattern,
     RecognizerRegistry,
+    RecognizerResult,
 )
 from presidio_analyzer.nlp_engine import NlpEngineProvider
-from presidio_analyzer.predefined_recognizers import EmailRecognizer, PhoneRecognizer
+from presidio_analyzer.predefined_recognizers import EmailRecognizer
 from .models import Config, Entity
 from ..utils import find_name_variants, find_number_variants
-from collections import defaultdict
+from collections import Counter, OrderedDict
+
+# Default location of the on-disk analyzer result cache used by the CLI
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "did" / "analyze"
+
+# Entity categories, in config order
+CATEGORIES = (
+    "person",
+    "email_address",
+    "location",
+    "phone_number",
+    "date_number",
+    "id_number",
+    "code_number",
+    "general_number",
+)
 
+# Presidio entity types kept, and the category each is collected under
+ENTITY_TYPE_CATEGORIES = {
+    "PERSON": "person",
+    "EMAIL_ADDRESS": "email_address",
+    "LOCATION": "location",
+    "PHONE_NUMBER": "phone_number",
+    "DATE_TIME": "date_number",
+    "GENERAL_NUMBER": "general_number",
+    "DATE_NUMBER": "date_number",
+    "ID_NUMBER": "id_number",
+    "CODE_NUMBER": "code_number",
+}
+
+# Categories whose variants are replaced without word boundaries
+BARE_CATEGORIES = frozenset(
+    (
+        "location",
+        "phone_number",
+        "date_number",
+        "id_number",
+        "code_number",
+        "general_number",
+    )
+)
 
-def get_custom_recognizers(language):
-    """Return a list of custom PatternRecognizers for different entity types."""
-    recognizers = []
+# Words near a phone number that raise its score
+PHONE_NUMBER_CONTEXT = (
+    "phone",
+    "number",
+    "telephone",
+    "cell",
+    "cellphone",
+    "mobile",
+    "call",
+    "tel",
+    "mobil",
+)
+
+# Words near a general number that raise its score; Presidio matches these
+# as substrings of the surrounding lemmas, so they stay an ordered sequence
+GENERAL_NUMBER_CONTEXT = (
+    "account",
+    "phone",
+    "code",
+    "number",
+    "id",
+    "tel",
+    "mobil",
+    "cpr",
+    "personnummer",
+)
+
+# spaCy model used for each supported language
+SPACY_MODELS = {"da": "da_core_news_md", "en": "en_core_web_md"}
+
+# spaCy components that set sentence starts, which NER needs so entities do
+# not cross a sentence break
+SENTENCE_COMPONENTS = ("parser", "senter", "sentencizer")
+
+# Number of texts spaCy processes per nlp.pipe batch
+SPACY_BATCH_SIZE = int(os.environ.get("DID_SPACY_BATCH_SIZE", "32"))
+
+# Fewest uncached texts worth spreading over worker processes
+PARALLEL_MIN_TEXTS = 3
+
+# Number of analyzer results kept in memory per Anonymizer
+RESULTS_MEMO_SIZE = 256
+
+# Most result files kept in the cache directory; the least recently used
+# are pruned after each write
+ANALYZE_CACHE_MAX_ENTRIES = int(os.environ.get("DID_CACHE_MAX_ENTRIES", "1000"))
 
-    # General Number
-    general_patterns = [
+# Bump when recognizers change so stale cached results are not reused
+_ANALYZE_CACHE_VERSION = "4"
+
+_WORD_CHAR = re.compile(r"\w")
+
+_ANALYZER_LOCK = threading.Lock()
+
+# Hyphen plus newline between two alphanumerics, as left by line wrapping
+_HYPHEN_BREAK = re.compile(r"(?<=[^\W_])-\n(?=[^\W_])")
+
+
+def results_digest(language: str, text: str, model: str = "") -> str:
+    """Return the content hash used to key cached analyzer results."""
+    key = f"{_ANALYZE_CACHE_VERSION}\0{language}\0{model}\0{text}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Custom recognizer patterns per entity type, shared by every analyzer so
+# Presidio's lazily compiled regexes are built once
+CUSTOM_PATTERNS = {
+    # A plain pattern instead of Presidio's phonenumbers-based PhoneRecognizer,
+    # which parses every candidate span per region; separators stay on one
+    # line, and the start check keeps a leading "+" inside the match
+    "PHONE_NUMBER": (
+        Pattern(
+            name="phone_like",
+            regex=r"(?<![\w+])(?:\+?\d{1,3}[ \-]?)?(?:\d[ \-]?){6,14}\d\b",
+            score=0.6,
+        ),
+    ),
+    "GENERAL_NUMBER": (
         Pattern(
             name="general_number",
-            regex=r"[+(\d][\d\.\-,/()+ ]*\d(?:[.,+][a-zA-Z]{1,3})?",
+            # Possessive separator runs and no restart inside a run of start
+            # characters keep this linear on long runs of "(" or "+"
+            regex=r"(?<![+(\d])[+(\d](?:[\.\-,/()+ ]*+\d)++(?:[.,+][a-zA-Z]{1,3})?",
             score=0.7,
         ),
+        # Also covers four-digit codes, which previously had their own lower
+        # scoring pattern that deduplication always discarded
         Pattern(name="DIGIT_SEQUENCE", regex=r"\b\d{4,6}\b", score=0.8),
-        Pattern(name="four_digit_code", regex=r"\b\d{4}\b", score=0.6),
         Pattern(name="cpr_number", regex=r"\b\d{6}-\d{4}\b", score=0.6),
-    ]
-    recognizers.append(
-        PatternRecognizer(
-            supported_entity="GENERAL_NUMBER",
-            patterns=general_patterns,
-            context=[
-                "account",
-                "phone",
-                "code",
-                "number",
-                "id",
-                "tel",
-                "mobil",
-                "cpr",
-                "personnummer",
-            ],
-            supported_language=language,
-        )
-    )
-
-    # Date Number
-    date_patterns = [
+    ),
+    "DATE_NUMBER": (
         Pattern(
             name="date_number", regex=r"\b\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b", score=0.7
         ),
         Pattern(name="dotted_triplet", regex=r"\d{2}\.\d{2}\.\d{2}", score=0.7),
-    ]
-    recognizers.append(
-        PatternRecognizer(
-            supported_entity="DATE_NUMBER",
-            patterns=date_patterns,
-            supported_language=language,
-        )
-    )
-
-    # ID Number
-    id_patterns = [
+    ),
+    "ID_NUMBER": (
         Pattern(name="id_code", regex=r"\b\d{3,}[-\d]{3,}\s*\(\d{3,}\)\b", score=0.8),
         Pattern(name="year_based_id", regex=r"\b\d{4}-\d{5}\b", score=0.8),
-    ]
-    recognizers.append(
-        PatternRecognizer(
-            supported_entity="ID_NUMBER",
-            patterns=id_patterns,
-            supported_language=language,
-        )
-    )
-
-    # Code Number
-    code_patterns = [
+    ),
+    "CODE_NUMBER": (
         Pattern(name="parenthesized_code", regex=r"\(\d{6}\)", score=0.8),
         Pattern(
             name="channel_identifier",
             regex=r"\b\d{1,2},\d{1,2}\.[a-zA-Z]{2,3}\b",
             score=0.7,
         ),
-    ]
-    recognizers.append(
+    ),
+}
+
+# Context words boosting the custom recognizers' scores
+CUSTOM_CONTEXT = {
+    "PHONE_NUMBER": PHONE_NUMBER_CONTEXT,
+    "GENERAL_NUMBER": GENERAL_NUMBER_CONTEXT,
+}
+
+
+@lru_cache(maxsize=None)
+def get_custom_recognizers(language):
+    """Return the custom PatternRecognizers for a language, built once."""
+    return tuple(
         PatternRecognizer(
-            supported_entity="CODE_NUMBER",
-            patterns=code_patterns,
+            supported_entity=entity,
+            patterns=list(patterns),
+            context=list(CUSTOM_CONTEXT.get(entity, ())) or None,
             supported_language=language,
         )
+        for entity, patterns in CUSTOM_PATTERNS.items()
     )
 
-    return recognizers
+
+def _overlaps(spans: list, start: int, end: int) -> bool:
+    """Return True if [start, end) overlaps a span in a sorted, disjoint list."""
+    i = bisect_right(spans, start, key=itemgetter(1))
+    return i < len(spans) and spans[i][0] < end
+
+
+def select_non_overlapping(results):
+    """Keep results in the given order, skipping any that overlap a kept one."""
+    spans = []
+    selected = []
+    for result in results:
+        if not _overlaps(spans, result.start, result.end):
+            insort(spans, (result.start, result.end))
+            selected.append(result)
+    return selected
 
 
 def filter_non_overlapping(base_results, extra_results):
     """Return extra_results that do not overlap with base_results."""
-    non_overlapping = []
-    for er in extra_results:
-        overlap = False
-        for br in base_results:
-            if not (er.end <= br.start or er.start >= br.end):
-                overlap = True
-                break
-        if not overlap:
-            non_overlapping.append(er)
-    return non_overlapping
+    spans = []
+    for br in sorted(base_results, key=lambda r: r.start):
+        if spans and br.start < spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], br.end))
+        else:
+            spans.append((br.start, br.end))
+    return [er for er in extra_results if not _overlaps(spans, er.start, er.end)]
+
+
+def needs_word_boundary(cat: str, variant: str) -> bool:
+    """Return True if a variant must be replaced on word boundaries only."""
+    if cat in BARE_CATEGORIES:
+        return False
+    return not (cat == "person" and "\n" in variant)
+
+
+def compile_variants(entries):
+    """Compile variants into one pattern matching the longest variant first.
+
+    entries holds (variant, word_bounded) pairs. A variant listed both ways
+    tries its word-bounded form first and falls back to a bare match inside
+    an empty group; match_entry tells the two apart. Returns None when there
+    are no variants.
+    """
+    trie = {}
+    for variant, word_bounded in entries:
+        tail = ""
+        if word_bounded:
+            # Leading \b checked from the end of the match
+            lookbehind = "(?<!" if _WORD_CHAR.match(variant) else "(?<="
+            tail = lookbehind + r"\w[\s\S]{%d})\b" % len(variant)
+        node = trie
+        for char in variant:
+            node = node.setdefault(char, {})
+        node.setdefault("", {})[word_bounded] = tail
+    if not trie:
+        return None
+    return re.compile(_trie_pattern(trie))
+
+
+def match_entry(match, entries) -> tuple:
+    """Return the (variant, word_bounded) entry a compile_variants match hit."""
+    variant = match.group(0)
+    # Only the bare fallback of a variant listed both ways sets a group
+    if match.lastindex is None and (variant, True) in entries:
+        return variant, True
+    return variant, False
+
+
+def _trie_pattern(node: dict) -> str:
+    """Build a regex from a character trie, preferring the longest variant."""
+    branches = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    ends = node.get("")
+    if ends is not None:
+        if len(ends) == 1:
+            branches.append(next(iter(ends.values())))
+        else:
+            branches.append("(?:" + ends[True] + "|())")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+def build_analyzer(
+    language: str, model: str | None = None, device: str = "auto"
+) -> AnalyzerEngine:
+    """Return the Presidio analyzer for a language, shared across instances.
+
+    model overrides the default spaCy pipeline for language, e.g. a smaller
+    or locally optimized package. device is "auto" (GPU if spaCy can use
+    one), "gpu" (fail without one) or "cpu".
+    """
+    # lru_cache alone may build the same engine twice under concurrent calls
+    with _ANALYZER_LOCK:
+        return _build_analyzer(language, model, device)
+
+
+@lru_cache(maxsize=4)
+def set_sentence_starts(nlp):
+    """Set sentence starts with the cheapest component the pipeline offers."""
+    if "senter" in nlp.disabled and "parser" in nlp.pipe_names:
+        # The bundled senter sets the same boundaries far faster than the
+        # parser, whose dependency parse no recognizer reads
+        nlp.enable_pipe("senter")
+        nlp.disable_pipe("parser")
+    elif not any(c in nlp.pipe_names for c in SENTENCE_COMPONENTS):
+        nlp.add_pipe("sentencizer", first=True)
+
+
+def _build_analyzer(language: str, model: str | None, device: str) -> AnalyzerEngine:
+    """Build the Presidio analyzer; called through build_analyzer only."""
+    # Must run before the pipelines are loaded to place them on the GPU
+    if device == "gpu":
+        spacy.require_gpu()
+    elif device == "auto":
+        spacy.prefer_gpu()
+    # Configure spaCy model based on language
+    model_names = dict(SPACY_MODELS)
+    if model is not None:
+        model_names[language] = model
+    conf = {
+        "nlp_engine_name": "spacy",
+        "models": [
+            {"lang_code": lang, "model_name": model_name}
+            for lang, model_name in model_names.items()
+            if lang in (language, "en")
+        ],
+        "ner_model_configuration": {
+            "model_to_presidio_entity_mapping": {
+                "PER": "PERSON",
+                "LOC": "LOCATION",
+                "GPE": "LOCATION",
+                "ORG": "ORGANIZATION",
+                "MISC": "NRP",
+            },
+            "labels_to_ignore": ["O"],
+        },
+    }
+
+    nlp_engine = NlpEngineProvider(nlp_configuration=conf).create_engine()
+    for nlp in nlp_engine.nlp.values():
+        set_sentence_starts(nlp)
+    registry = RecognizerRegistry(supported_languages=[language, "en"])
+    registry.load_predefined_recognizers(languages=[language, "en"])
+    registry.remove_recognizer("PhoneRecognizer")
+    registry.add_recognizer(EmailRecognizer(supported_language=language))
+    for custom_recognizer in get_custom_recognizers(language):
+        registry.add_recognizer(custom_recognizer)
+
+    return AnalyzerEngine(
+        registry=registry,
+        nlp_engine=nlp_engine,
+        supported_languages=[language, "en"],
+    )
 
 
-class Anonymizer:
-    """Handles entity detection and anonymization."""
+# libyaml's C emitter when available; the pure-Python dumper otherwise
+_BaseDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+class QuotedStringDumper(_BaseDumper):
+    """Dump string values double-quoted while keeping mapping keys plain."""
 
-    def __init__(self, language="en"):
-        # Configure spaCy model based on language
-        conf = {
-            "nlp_engine_name": "spacy",
-            "models": [
-                {"lang_code": "da", "model_name": "da_core_news_md"},
-                {"lang_code": "en", "model_name": "en_core_web_md"},
+    def represent_plain_key_mapping(self, data):
+        return yaml.MappingNode(
+            "tag:yaml.org,2002:map",
+            [
+                (
+                    yaml.ScalarNode("tag:yaml.org,2002:str", key),
+                    self.represent_data(value),
+                )
+                for key, value in data.items()
             ],
-            "ner_model_configuration": {
-                "model_to_presidio_entity_mapping": {
-                    "PER": "PERSON",
-                    "LOC": "LOCATION",
-                    "GPE": "LOCATION",
-                    "ORG": "ORGANIZATION",
-                    "MISC": "NRP",
-                },
-                "labels_to_ignore": ["O"],
-            },
-        }
-
-        nlp_engine = NlpEngineProvider(nlp_configuration=conf).create_engine()
-        registry = RecognizerRegistry(supported_languages=[language, "en"])
-        registry.load_predefined_recognizers(languages=[language, "en"])
-        registry.add_recognizer(EmailRecognizer(supported_language=language))
-        registry.add_recognizer(PhoneRecognizer(supported_language=language))
-        for custom_recognizer in get_custom_recognizers(language):
-            registry.add_recognizer(custom_recognizer)
-
-        self.analyzer = AnalyzerEngine(
-            registry=registry,
-            nlp_engine=nlp_engine,
-            supported_languages=[language, "en"],
         )
 
-        self.counts = {
-            "person_found": 0,
-            "person_replaced": 0,
-            "email_address_found": 0,
-            "email_address_replaced": 0,
-            "location_found": 0,
-            "location_replaced": 0,
-            "phone_number_found": 0,
-            "phone_number_replaced": 0,
-            "date_number_found": 0,
-            "date_number_replaced": 0,
-            "id_number_found": 0,
-            "id_number_replaced": 0,
-            "code_number_found": 0,
-            "code_number_replaced": 0,
-            "general_number_found": 0,
-            "general_number_replaced": 0,
-        }
+    def represent_quoted_str(self, data):
+        return self.represent_scalar("tag:yaml.org,2002:str", data, style='"')
+
+
+QuotedStringDumper.add_representer(dict, QuotedStringDumper.represent_plain_key_mapping)
+QuotedStringDumper.add_representer(str, QuotedStringDumper.represent_quoted_str)
+
+# libyaml's C parser when available; the pure-Python loader otherwise
+_BaseLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class ConfigLoader(_BaseLoader):
+    """Load configs with YAML 1.2 style plain scalars.
+
+    PyYAML resolves plain scalars by YAML 1.1 rules, where hand-edited
+    values like yes, 012 or 12:30 become booleans and integers; here only
+    nulls, true/false and decimal integers are resolved, and everything
+    else stays a string.
+    """
+
+
+ConfigLoader.yaml_implicit_resolvers = {}
+ConfigLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:null", re.compile(r"^(?:~|null|Null|NULL|)$"), [*"~nN", ""]
+)
+ConfigLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:bool",
+    re.compile(r"^(?:true|True|TRUE|false|False|FALSE)$"),
+    list("tTfF"),
+)
+ConfigLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:int",
+    re.compile(r"^[-+]?(?:0|[1-9][0-9]*)$"),
+    list("-+0123456789"),
+)
+
+
+def load_yaml(stream):
+    """Parse a YAML or JSON config from a string or stream."""
+    return yaml.load(stream, Loader=ConfigLoader)
+
+
+class Anonymizer:
+    """Handles entity detection and anonymization."""
+
+    _COUNT_KEYS = tuple(
+        f"{cat}_{kind}" for cat in CATEGORIES for kind in ("found", "replaced")
+    )
+
+    def __init__(
+        self,
+        language="en",
+        cache_dir=None,
+        n_process=1,
+        model=None,
+        device="auto",
+        batch_size=SPACY_BATCH_SIZE,
+    ):
+        self.counts = dict.fromkeys(self._COUNT_KEYS, 0)
         self.entities: Config = Config()
+        self._replacements = None
+        self._results_memo = OrderedDict()
         self.language = language
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.n_process = n_process
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+
+    def reset(self):
+        """Forget detected entities, replacements and counts, keeping the analyzer."""
+        self.counts = dict.fromkeys(self._COUNT_KEYS, 0)
+        self.entities = Config()
+        self._replacements = None
+
+    @cached_property
+    def analyzer(self) -> AnalyzerEngine:
+        """Presidio analyzer for this language, loaded on first use."""
+        return build_analyzer(self.language, self.model, self.device)
 
     def preprocess_text(self, text: str):
         """Preprocess text to join hyphenated multi-line words for detection."""
-        positions = []
-        detection_text = ""
-        i = 0
-        while i < len(text):
-            if (
-                i > 0
-                and (text[i - 1].isalpha() or text[i - 1].isdigit())
-                and text[i] == "-"
-                and i + 1 < len(text)
-                and text[i + 1] == "\n"
-                and i + 2 < len(text)
-                and (text[i + 2].isalpha() or text[i + 2].isdigit())
-            ):
-                i += 2  # Skip -\n
-                continue
-            detection_text += text[i]
-            positions.append(i)
-            i += 1
+        # Detection offsets where a "-\n" was removed, one entry per break;
+        # the substring check skips the regex scan for most texts
+        gaps = []
+        if "-\n" in text:
+            gaps = [
+                m.start() - 2 * i for i, m in enumerate(_HYPHEN_BREAK.finditer(text))
+            ]
+        detection_text = _HYPHEN_BREAK.sub("", text) if gaps else text
+        length = len(detection_text)
+
+        def to_original(d: int) -> int:
+            return d + 2 * bisect_right(gaps, d)
 
         def map_to_original(d_start: int, d_end: int):
-            if d_start >= len(positions):
+            if d_start >= length:
                 return len(text), len(text)
-            o_start = positions[d_start]
-            o_end = (
-                positions[d_end - 1] + 1
-                if d_end > 0 and d_end <= len(positions)
-                else len(text)
-            )
+            o_start = to_original(d_start)
+            o_end = to_original(d_end - 1) + 1 if 0 < d_end <= length else len(text)
             return o_start, o_end
 
         return detection_text, map_to_original
 
+    def _read_cached_results(self, digest: str):
+        """Return cached analyzer results for a digest, or None on a cache miss."""
+        results = self._results_memo.get(digest)
+        if results is not None:
+            self._results_memo.move_to_end(digest)
+            return results
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{digest}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = [RecognizerResult(*row) for row in json.load(f)]
+            os.utime(path)  # Mark as recently used for pruning
+        except (OSError, ValueError, TypeError):
+            return None  # Missing or unreadable entry, fall back to the analyzer
+        self._remember_results(digest, results)
+        return results
+
+    def _write_cached_results(self, digest: str, results: list):
+        """Store analyzer results in memory and in the cache directory, if enabled."""
+        self._remember_results(digest, results)
+        if self.cache_dir is None:
+            return
+        # Entries hold entity offsets of the inputs, so only the owner may
+        # read them; the temporary file is created with mode 0600
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        data = json.dumps([[r.entity_type, r.start, r.end, r.score] for r in results])
+        tf = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.cache_dir, suffix=".tmp", delete=False
+        )
+        try:
+            with tf:
+                tf.write(data)
+            os.replace(tf.name, self.cache_dir / f"{digest}.json")
+        except BaseException:
+            os.unlink(tf.name)
+            raise
+
+    def _prune_cache(self):
+        """Delete the least recently used result files beyond the size limit."""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime_ns, path))
+            except OSError:
+                continue  # Removed by a concurrent run
+        entries.sort(reverse=True)
+        for _, path in entries[ANALYZE_CACHE_MAX_ENTRIES:]:
+            path.unlink(missing_ok=True)
+
+    def _remember_results(self, digest: str, results: list):
+        """Keep results in the in-memory LRU, evicting the oldest entry."""
+        self._results_memo[digest] = results
+        self._results_memo.move_to_end(digest)
+        if len(self._results_memo) > RESULTS_MEMO_SIZE:
+            self._results_memo.popitem(last=False)
+
+    def _worker_count(self, n_texts: int) -> int:
+        """Number of spaCy processes for n_texts; -1 means one per CPU."""
+        if n_texts < PARALLEL_MIN_TEXTS:
+            return 1  # Starting workers costs more than it saves
+        n_process = self.n_process if self.n_process > 0 else os.cpu_count() or 1
+        return min(n_process, n_texts)
+
+    def analyze_texts(self, detection_texts: list) -> list:
+        """Analyze texts with one batched spaCy pass, reusing cached results."""
+        model = self.model or SPACY_MODELS.get(self.language, "")
+        digests = [results_digest(self.language, t, model) for t in detection_texts]
+        all_results = [self._read_cached_results(d) for d in digests]
+        missing = [i for i, results in enumerate(all_results) if results is None]
+        if missing:
+            # Run spaCy over all uncached texts via nlp.pipe, optionally spread
+            # over worker processes, then hand the artifacts to the recognizers
+            # so the pipeline is not run again
+            batch = self.analyzer.nlp_engine.process_batch(
+                [detection_texts[i] for i in missing],
+                language=self.language,
+                batch_size=self.batch_size,
+                n_process=self._worker_count(len(missing)),
+            )
+            for i, (_, nlp_artifacts) in zip(missing, batch):
+                all_results[i] = self.analyzer.analyze(
+                    text=detection_texts[i],
+                    language=self.language,
+                    entities=None,
+                    nlp_artifacts=nlp_artifacts,
+                )
+                self._write_cached_results(digests[i], all_results[i])
+            if self.cache_dir is not None:
+                self._prune_cache()
+        return all_results
+
     def detect_entities(self, texts: list):
         """Detect entities in multiple texts using Presidio."""
-        type_mapping = {
-            "PERSON": "person",
-            "EMAIL_ADDRESS": "email_address",
-            "LOCATION": "location",
-            "PHONE_NUMBER": "phone_number",
-            "DATE_TIME": "date_number",
-            "GENERAL_NUMBER": "general_number",
-            "DATE_NUMBER": "date_number",
-            "ID_NUMBER": "id_number",
-            "CODE_NUMBER": "code_number",
-        }
-        all_entities = defaultdict(list)
-        for text in texts:
-            detection_text, map_to_original = self.preprocess_text(text)
-            # Run all recognizers
-            results = self.analyzer.analyze(
-                text=detection_text,
-                language=self.language,
-                entities=None,
+        # Insertion-ordered set of detected texts per category
+        all_entities = {cat: {} for cat in CATEGORIES}
+        self._replacements = None
+        preprocessed = [self.preprocess_text(text) for text in texts]
+        # Run all recognizers
+        all_results = self.analyze_texts([d for d, _ in preprocessed])
+        for text, (_, map_to_original), results in zip(
+            texts, preprocessed, all_results
+        ):
+
+            # Sort by score descending to prioritize higher confidence matches,
+            # skipping unmapped types so they don't block mapped ones
+            sorted_results = sorted(
+                (r for r in results if r.entity_type in ENTITY_TYPE_CATEGORIES),
+                key=attrgetter("score"),
+                reverse=True,
             )
 
-            # Sort by score descending to prioritize higher confidence matches
-            sorted_results = sorted(results, key=lambda r: -r.score)
-
-            # Select non-overlapping results, preferring higher scores, but skip unmapped to not block mapped ones
-            selected_results = []
-            for result in sorted_results:
-                if result.entity_type not in type_mapping:
-                    continue  # Skip unmapped entities to avoid blocking
-                overlap = False
-                for sel in selected_results:
-                    if not (result.end <= sel.start or result.start >= sel.end):
-                        overlap = True
-                        break
-                if not overlap:
-                    selected_results.append(result)
+            # Select non-overlapping results, preferring higher scores
+            selected_results = select_non_overlapping(sorted_results)
 
             # Process selected results
             for result in selected_results:
                 o_start, o_end = map_to_original(result.start, result.end)
-                try:
-                    entity_text = text[o_start:o_end].strip()
-                except IndexError:
-                    print(
-                        f"Index error: o_start={o_start}, o_end={o_end}, len(text)={len(text)}"
-                    )
-                    entity_text = ""
-                ent_type = result.entity_type
-                if ent_type in type_mapping:
-                    mapped = type_mapping[ent_type]
-                    if entity_text and entity_text not in all_entities[mapped]:
-                        all_entities[mapped].append(entity_text)
-                        self.counts[f"{mapped}_found"] += 1
+                entity_text = text[o_start:o_end].strip()
+                if entity_text:
+                    category = ENTITY_TYPE_CATEGORIES[result.entity_type]
+                    all_entities[category].setdefault(entity_text)
 
         # Process groupings
-        for cat in [
-            "person",
-            "email_address",
-            "location",
-            "phone_number",
-            "date_number",
-            "id_number",
-            "code_number",
-            "general_number",
-        ]:
-            items = all_entities.get(cat, [])
+        for cat in CATEGORIES:
+            items = list(all_entities[cat])
+            self.counts[f"{cat}_found"] += len(items)
             if cat == "person":
                 grouped = find_name_variants(items)
             elif cat == "email_address" or cat == "location":
@@ -290,84 +623,71 @@ class Anonymizer:
                 )
                 count += 1
 
-    def generate_yaml(self) -> str:
-        """Generate YAML configuration from detected entities with all strings quoted."""
+    def dump_yaml(self, stream):
+        """Write the YAML configuration to a text or binary stream."""
         data = self.entities.model_dump(by_alias=True, exclude_none=True)
+        # Wrappers such as NamedTemporaryFile are not IOBase subclasses, so
+        # their mode tells binary from text
+        binary = isinstance(
+            stream, (io.RawIOBase, io.BufferedIOBase)
+        ) or "b" in getattr(stream, "mode", "")
+        yaml.dump(
+            data,
+            stream,
+            Dumper=QuotedStringDumper,
+            sort_keys=False,
+            allow_unicode=True,
+            default_flow_style=False,
+            encoding="utf-8" if binary else None,
+        )
 
-        # Function to recursively quote all strings
-        def quote_strings(obj):
-            if isinstance(obj, dict):
-                return {k: quote_strings(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [quote_strings(item) for item in obj]
-            elif isinstance(obj, str):
-                return DoubleQuotedScalarString(obj)  # Wrap strings in double quotes
-            else:
-                return obj  # Leave other types as is
-
-        quoted_data = quote_strings(data)  # Apply quoting to data
-
-        yaml_instance = YAML()  # Create YAML instance
+    def generate_yaml(self) -> str:
+        """Generate YAML configuration from detected entities with all strings quoted."""
         stream = io.StringIO()  # Use StringIO for string output
-        yaml_instance.dump(quoted_data, stream)  # Dump the quoted data
+        self.dump_yaml(stream)
         return stream.getvalue()  # Return the string
 
+    def generate_json(self) -> str:
+        """Generate the configuration as JSON, which YAML loaders also accept."""
+        data = self.entities.model_dump(by_alias=True, exclude_none=True)
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
     def load_replacements(self, config: dict):
         """Load replacements from YAML config using Pydantic validation."""
         self.entities = Config.model_validate(config)
+        self._replacements = self._build_replacements()
+
+    def _build_replacements(self):
+        """Compile all variants into one trie-shaped pattern and a lookup."""
+        # The first entity listing a variant keeps it, except that a later
+        # bare entry still replaces the in-word occurrences a bounded one skips
+        lookup = {}
+        for cat in CATEGORIES:
+            for entity in getattr(self.entities, cat):
+                value = (entity.id, cat)
+                for v in entity.variants:
+                    if v and (v, False) not in lookup:
+                        lookup.setdefault((v, needs_word_boundary(cat, v)), value)
+        return compile_variants(lookup), lookup
 
     def anonymize(self, text: str) -> tuple:
         """Anonymize text by replacing known variants from config with their IDs."""
-        self.counts = {k: 0 for k in self.counts}
-        category_mapping = {
-            "person": "person_replaced",
-            "email_address": "email_address_replaced",
-            "location": "location_replaced",
-            "phone_number": "phone_number_replaced",
-            "date_number": "date_number_replaced",
-            "id_number": "id_number_replaced",
-            "code_number": "code_number_replaced",
-            "general_number": "general_number_replaced",
-        }
-        all_replacements = []
-        for cat, replaced_key in category_mapping.items():
-            found_key = replaced_key.replace("_replaced", "_found")
-            entities = getattr(self.entities, cat)
-            for entity in entities:
-                for variant in entity.variants:
-                    escaped = re.escape(variant)
-                    if cat in [
-                        "phone_number",
-                        "date_number",
-                        "id_number",
-                        "code_number",
-                        "general_number",
-                    ] or (cat == "person" and "\n" in variant):
-                        pattern = escaped
-                    elif cat == "location":
-                        pattern = escaped
-                    else:
-                        pattern = r"\b" + escaped + r"\b"
-                    all_replacements.append(
-                        (variant, pattern, entity.id, found_key, replaced_key)
-                    )
-
-        # Sort by variant length descending
-        sorted_replacements = sorted(
-            all_replacements, key=lambda x: len(x[0]), reverse=True
-        )
-
-        for (
-            variant,
-            pattern,
-            replacement,
-            found_key,
-            replaced_key,
-        ) in sorted_replacements:
-            matches = re.findall(pattern, text)
-            count = len(matches)
-            self.counts[found_key] += count
-            self.counts[replaced_key] += count
-            text = re.sub(pattern, replacement, text)
-
+        self.counts = dict.fromkeys(self._COUNT_KEYS, 0)
+        if self._replacements is None:
+            self._replacements = self._build_replacements()
+        pattern, lookup = self._replacements
+        if pattern is None:
+            return text, self.counts
+        hits = Counter()
+
+        def replace(match):
+            replacement, cat = lookup[match_entry(match, lookup)]
+            hits[cat] += 1
+            return replacement
+
+        text = pattern.sub(replace, text)
+        # Every match found is also replaced
+        for cat, count in hits.items():
+            self.counts[f"{cat}_found"] = count
+            self.counts[f"{cat}_replaced"] = count
         return text, self.counts
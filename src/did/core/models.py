@@ -1,9 +1,12 @@
 """Pydantic models for entity configuration."""
 
 from pydantic import BaseModel, Field
+from pydantic.dataclasses import dataclass
 
 
-class Entity(BaseModel):
+# A slotted dataclass rather than a BaseModel keeps large configs small
+@dataclass(slots=True)
+class Entity:
     """Model for an individual entity with variants."""
 
     id: str
@@ -1,26 +1,83 @@
 """Utilities for handling different file types."""
 
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import re
-import bibtexparser
-from .core.anonymizer import Anonymizer
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .core.anonymizer import Anonymizer
+
+# Read/write buffer for document I/O; large inputs need far fewer syscalls
+BUFFER_SIZE = 1 << 20
+
+# Fewest files worth starting worker processes for in anonymize_files
+PARALLEL_MIN_FILES = 2
+
+# LaTeX markup stripped from .tex input before detection; the possessive
+# negated classes match what the lazy ".*?" forms did without backtracking
+_TEX_COMMAND = re.compile(r"\\\w[^\s}]*+[\s}]")
+_TEX_ENVIRONMENT = re.compile(r"\\begin\{[^}]*+\}.*?\\end\{[^}]*+\}", re.DOTALL)
+_WHITESPACE_RUN = re.compile(r"\s+")
+
+# Markdown to Typst substitutions, applied in order; underscore italics and
+# inline code are spelled the same in both and pass through unchanged
+_MD_TO_TYPST = (
+    # Headings
+    (re.compile(r"^#\s+(.*)$", re.M), r"= \1"),
+    (re.compile(r"^##\s+(.*)$", re.M), r"== \1"),
+    (re.compile(r"^###\s+(.*)$", re.M), r"=== \1"),
+    (re.compile(r"^####\s+(.*)$", re.M), r"==== \1"),
+    # Italic and bold (process italic first to avoid conflict)
+    (re.compile(r"\*(.*?)\*"), r"_\1_"),
+    (re.compile(r"\*\*(.*?)\*\*"), r"*\1*"),
+    (re.compile(r"__(.*?)__"), r"*\1*"),
+    # Links
+    (re.compile(r"\[(.*?)\]\((.*?)\)"), r'#link("\2")[\1]'),
+)
+
+
+def write_text_atomic(path: Path, text: str):
+    """Write text as UTF-8 via a temporary file that replaces path on success."""
+    path = Path(path)
+    data = text.encode("utf-8")
+    if path.exists():
+        mode = path.stat().st_mode & 0o777
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    tf = tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    )
+    try:
+        with tf:
+            tf.write(data)
+        os.chmod(tf.name, mode)
+        os.replace(tf.name, path)
+    except BaseException:
+        os.unlink(tf.name)
+        raise
 
 
 def extract_text(file_path: Path) -> str:
     """Extract processable text from the file based on its type."""
     if file_path.suffix in [".md", ".txt"]:
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open(file_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             return f.read()
     elif file_path.suffix == ".tex":
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open(file_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             content = f.read()
-            body_text = re.sub(r"\\[\w]+.*?(\s|})", " ", content)
-            body_text = re.sub(
-                r"\\begin\{.*?\}.*?\\end\{.*?\}", " ", body_text, flags=re.DOTALL
-            )
-            return re.sub(r"\s+", " ", body_text).strip()
+            body_text = _TEX_COMMAND.sub(" ", content)
+            body_text = _TEX_ENVIRONMENT.sub(" ", body_text)
+            return _WHITESPACE_RUN.sub(" ", body_text).strip()
     elif file_path.suffix == ".bib":
-        with open(file_path, "r", encoding="utf-8") as bibfile:
+        # Imported here so that `did --help` and non-BibTeX runs skip it
+        import bibtexparser
+
+        with open(file_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as bibfile:
             database = bibtexparser.load(bibfile)
             text_content = []
             for entry in database.entries:
@@ -31,49 +88,93 @@ def extract_text(file_path: Path) -> str:
         raise ValueError(f"Unsupported file type: {file_path.suffix}")
 
 
-def anonymize_file(input_path: Path, anonymizer: Anonymizer, output_path: Path) -> dict:
+def anonymize_file(
+    input_path: Path, anonymizer: "Anonymizer", output_path: Path
+) -> dict:
     """Anonymize the file using the provided anonymizer and return counts."""
     counts = {k: 0 for k in anonymizer.counts}
     if input_path.suffix in [".md", ".txt", ".tex"]:
-        with open(input_path, "r", encoding="utf-8") as f:
+        with open(input_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as f:
             text = f.read()
         anonymized_text, field_counts = anonymizer.anonymize(text)
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(anonymized_text)
+        write_text_atomic(output_path, anonymized_text)
         for k in counts:
             counts[k] += field_counts[k]
     elif input_path.suffix == ".bib":
-        with open(input_path, "r", encoding="utf-8") as bibfile:
+        import bibtexparser
+
+        with open(input_path, "r", encoding="utf-8", buffering=BUFFER_SIZE) as bibfile:
             database = bibtexparser.load(bibfile)
         for entry in database.entries:
-            for field in list(entry.keys()):
-                if field in entry:
-                    field_text = str(entry[field])
-                    anonymized_field, field_counts = anonymizer.anonymize(field_text)
-                    entry[field] = anonymized_field
-                    for k in counts:
-                        counts[k] += field_counts[k]
-        with open(output_path, "w", encoding="utf-8") as bibfile_out:
-            bibtexparser.dump(database, bibfile_out)
+            # Values are replaced in place; the set of fields never changes
+            for field, value in entry.items():
+                anonymized_field, field_counts = anonymizer.anonymize(str(value))
+                entry[field] = anonymized_field
+                for k in counts:
+                    counts[k] += field_counts[k]
+        write_text_atomic(output_path, bibtexparser.dumps(database))
     else:
         raise ValueError(f"Unsupported file type: {input_path.suffix}")
     return counts
 
 
+# Anonymizer loaded once per worker process by _init_worker
+_worker_anonymizer = None
+
+
+def _config_anonymizer(config: dict) -> "Anonymizer":
+    """Create an Anonymizer with replacements loaded from a config dict."""
+    from .core.anonymizer import Anonymizer
+
+    anonymizer = Anonymizer()
+    anonymizer.load_replacements(config)
+    return anonymizer
+
+
+def _init_worker(config: dict):
+    """Load the replacement config into this worker's Anonymizer."""
+    global _worker_anonymizer
+    _worker_anonymizer = _config_anonymizer(config)
+
+
+def _anonymize_in_worker(input_path: Path, output_path: Path) -> dict:
+    """Anonymize one file with this worker's Anonymizer."""
+    return anonymize_file(input_path, _worker_anonymizer, output_path)
+
+
+def anonymize_files(
+    input_paths: list, config: dict, output_paths: list, max_workers=None
+) -> dict:
+    """Anonymize files in worker processes and return the summed counts."""
+    input_paths = [Path(p) for p in input_paths]
+    output_paths = [Path(p) for p in output_paths]
+    if len(input_paths) < PARALLEL_MIN_FILES or max_workers == 1:
+        anonymizer = _config_anonymizer(config)
+        return _sum_counts(
+            anonymize_file(input_path, anonymizer, output_path)
+            for input_path, output_path in zip(input_paths, output_paths)
+        )
+    # Each worker builds its own replacement pattern from the plain config
+    # instead of receiving a pickled Anonymizer per file
+    with ProcessPoolExecutor(
+        max_workers, initializer=_init_worker, initargs=(config,)
+    ) as executor:
+        return _sum_counts(
+            executor.map(_anonymize_in_worker, input_paths, output_paths)
+        )
+
+
+def _sum_counts(results) -> dict:
+    """Sum per-file count dicts."""
+    counts = {}
+    for file_counts in results:
+        for k, v in file_counts.items():
+            counts[k] = counts.get(k, 0) + v
+    return counts
+
+
 def md_to_typst(md: str) -> str:
     """Simple Markdown to Typst converter."""
-    # Headings
-    md = re.sub(r"^#\s+(.*)$", r"= \1", md, flags=re.M)
-    md = re.sub(r"^##\s+(.*)$", r"== \1", md, flags=re.M)
-    md = re.sub(r"^###\s+(.*)$", r"=== \1", md, flags=re.M)
-    md = re.sub(r"^####\s+(.*)$", r"==== \1", md, flags=re.M)
-    # Italic and bold (process italic first to avoid conflict)
-    md = re.sub(r"\*(.*?)\*", r"_\1_", md)
-    md = re.sub(r"_(.*?)_", r"_\1_", md)
-    md = re.sub(r"\*\*(.*?)\*\*", r"*\1*", md)
-    md = re.sub(r"__(.*?)__", r"*\1*", md)
-    # Code
-    md = re.sub(r"`(.*?)`", r"`\1`", md)
-    # Links
-    md = re.sub(r"\[(.*?)\]\((.*?)\)", r'#link("\2")[\1]', md)
+    for pattern, replacement in _MD_TO_TYPST:
+        md = pattern.sub(replacement, md)
     return md
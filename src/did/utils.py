@@ -1,9 +1,22 @@
 """Utility functions for entity processing."""
 
+from collections import defaultdict
+from functools import lru_cache
+
 import numpy as np
 from rapidfuzz import fuzz
 from rapidfuzz.process import cdist
 
+# Rows of the similarity matrix scored per cdist call
+SIMILARITY_BLOCK_ROWS = 1024
+
+# Words that mark a detected "name" as something else
+_NON_NAME_WORDS = frozenset({"multiline", "phone", "account", "code", "street"})
+
+# Largest input grouped with plain pairwise scoring; cdist's fixed setup
+# cost outweighs the pair count below this
+SMALL_GROUPING_SIZE = 16
+
 
 def normalize_name(name: str) -> str:
     """Normalize a name for comparison."""
@@ -34,19 +47,19 @@ def is_valid_name(name: str) -> bool:
     return (
         1 <= len(words) <= 3
         and all(any(c.isalpha() for c in word) for word in words)
-        and not any(
-            word.lower() in ["multiline", "phone", "account", "code", "street"]
-            for word in words
-        )
+        and not any(word.lower() in _NON_NAME_WORDS for word in words)
     )
 
 
 def is_possible_variant(short_name: str, full_name: str) -> bool:
     """Check if short_name is a possible variant of full_name."""
-    short_norm = normalize_name(short_name)
-    full_norm = normalize_name(full_name)
-    short_parts = short_norm.split()
-    full_parts = full_norm.split()
+    return _is_variant_of_parts(
+        normalize_name(short_name).split(), normalize_name(full_name).split()
+    )
+
+
+def _is_variant_of_parts(short_parts: list, full_parts: list) -> bool:
+    """is_possible_variant on names already normalized and split into words."""
     if len(short_parts) >= len(full_parts) or len(short_parts) == 0:
         return False
     j = 0
@@ -67,46 +80,100 @@ def is_possible_variant(short_name: str, full_name: str) -> bool:
     return True
 
 
-def find_name_variants(names: list, threshold: float = 85) -> list:
-    """Group similar names using vectorized rapidfuzz."""
-    if not names:
-        return []
-    valid_names = [name for name in names if is_valid_name(name)]
-    if not valid_names:
-        return []
-    normalized = [normalize_name(name) for name in valid_names]
-    scores = cdist(normalized, normalized, scorer=fuzz.ratio)
-    grouped_names = []
-    visited = np.zeros(len(valid_names), dtype=bool)
-    for i in range(len(valid_names)):
+def group_by_similarity(
+    items: list, keys: list, threshold: float, workers: int = -1
+) -> list:
+    """Group items whose keys score above threshold against a group's first item."""
+    if len(keys) <= SMALL_GROUPING_SIZE:
+        return _group_small(items, keys, threshold)
+    # Score in row blocks and keep only the boolean matrix, so peak memory is
+    # one byte per pair rather than a full float32 score matrix. The row slice
+    # is never the choices list itself: rapidfuzz's same-object symmetric path
+    # skips its SIMD batching and runs about twice as slow
+    similar_to = np.empty((len(keys), len(keys)), dtype=bool)
+    for start in range(0, len(keys), SIMILARITY_BLOCK_ROWS):
+        block = cdist(
+            keys[start : start + SIMILARITY_BLOCK_ROWS],
+            keys,
+            scorer=fuzz.ratio,
+            score_cutoff=threshold,
+            dtype=np.float32,
+            workers=workers,
+        )
+        np.greater(block, threshold, out=similar_to[start : start + len(block)])
+    groups = []
+    visited = np.zeros(len(items), dtype=bool)
+    for i in range(len(items)):
         if visited[i]:
             continue
-        variants = [valid_names[i]]
-        visited[i] = True
-        # Collect all directly similar
-        similar = np.where(scores[i] > threshold)[0]
-        for j in similar:
-            if not visited[j]:
-                variants.append(valid_names[j])
+        # Collect all unvisited items directly similar to item i; every
+        # earlier item is already visited, so only the upper triangle is read
+        similar = np.flatnonzero(similar_to[i, i + 1 :] & ~visited[i + 1 :]) + i + 1
+        visited[similar] = True
+        groups.append([items[i]] + [items[j] for j in similar])
+    return groups
+
+
+def _group_small(items: list, keys: list, threshold: float) -> list:
+    """group_by_similarity for a few items, scoring pairs one at a time."""
+    groups = []
+    visited = [False] * len(items)
+    for i, key in enumerate(keys):
+        if visited[i]:
+            continue
+        group = [items[i]]
+        # Every earlier item is already visited, so only later ones can join
+        for j in range(i + 1, len(keys)):
+            if (
+                not visited[j]
+                and fuzz.ratio(key, keys[j], score_cutoff=threshold) > threshold
+            ):
                 visited[j] = True
-        if variants:
-            grouped_names.append(variants)
+                group.append(items[j])
+        groups.append(group)
+    return groups
+
+
+def find_name_variants(names: list, threshold: float = 85) -> list:
+    """Group similar names using vectorized rapidfuzz."""
+    return [list(group) for group in _group_names(tuple(names), threshold)]
+
+
+@lru_cache(maxsize=64)
+def _group_names(names: tuple, threshold: float) -> tuple:
+    """Group names; memoized on the exact name sequence and threshold."""
+    if not names:
+        return ()
+    pairs = [(name, normalize_name(name)) for name in names if is_valid_name(name)]
+    if not pairs:
+        return ()
+    valid_names, normalized = map(list, zip(*pairs))
+    grouped_names = group_by_similarity(valid_names, normalized, threshold)
     # Postprocessing: merge short variants into unique matching core groups
     current_groups = [list(g) for g in grouped_names]
     current_groups.sort(key=lambda g: max(len(name) for name in g), reverse=True)
-    merges = {}  # target_core: list of small_indices
+    merges = defaultdict(list)  # target_core: list of small_indices
+    # Each group's longest name, normalized and split once for all pairs
+    rep_parts = [normalize_name(max(g, key=len)).split() for g in current_groups]
+    # Groups by the initials of their representative's words; a variant needs
+    # every one of its initials in the core, so only those groups are walked
+    by_initial = defaultdict(set)
+    for idx, parts in enumerate(rep_parts):
+        for part in parts:
+            by_initial[part[0]].add(idx)
     for small_idx in range(1, len(current_groups)):
-        small_rep = max(current_groups[small_idx], key=len)
-        possible_cores = []
-        for core_idx in range(small_idx):
-            core_rep = max(current_groups[core_idx], key=len)
-            if is_possible_variant(small_rep, core_rep):
-                possible_cores.append(core_idx)
+        small_parts = rep_parts[small_idx]
+        if not small_parts:
+            continue
+        candidates = set.intersection(*(by_initial[sp[0]] for sp in small_parts))
+        possible_cores = [
+            core_idx
+            for core_idx in candidates
+            if core_idx < small_idx
+            and _is_variant_of_parts(small_parts, rep_parts[core_idx])
+        ]
         if len(possible_cores) == 1:
-            target = possible_cores[0]
-            if target not in merges:
-                merges[target] = []
-            merges[target].append(small_idx)
+            merges[possible_cores[0]].append(small_idx)
     # Apply merges
     new_groups = []
     indices_to_skip = set()
@@ -118,28 +185,20 @@ def find_name_variants(names: list, threshold: float = 85) -> list:
             for small_idx in merges[idx]:
                 group.extend(current_groups[small_idx])
                 indices_to_skip.add(small_idx)
-        new_groups.append(group)
-    return new_groups
+        new_groups.append(tuple(group))
+    return tuple(new_groups)
 
 
 def find_number_variants(numbers: list, threshold: float = 80) -> list:
     """Group similar numbers using vectorized rapidfuzz."""
+    return [list(group) for group in _group_numbers(tuple(numbers), threshold)]
+
+
+@lru_cache(maxsize=64)
+def _group_numbers(numbers: tuple, threshold: float) -> tuple:
+    """Group numbers; memoized on the exact number sequence and threshold."""
     if not numbers:
-        return []
+        return ()
     normalized = [normalize_number(num) for num in numbers]
-    scores = cdist(normalized, normalized, scorer=fuzz.ratio)
-    grouped_numbers = []
-    visited = np.zeros(len(numbers), dtype=bool)
-    for i in range(len(numbers)):
-        if visited[i]:
-            continue
-        variants = [numbers[i]]
-        visited[i] = True
-        similar = np.where(scores[i] > threshold)[0]
-        for j in similar:
-            if not visited[j]:
-                variants.append(numbers[j])
-                visited[j] = True
-        if variants:
-            grouped_numbers.append(variants)
-    return grouped_numbers
+    groups = group_by_similarity(numbers, normalized, threshold)
+    return tuple(tuple(group) for group in groups)
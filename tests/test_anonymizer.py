@@ -1,23 +1,39 @@
 """Tests for the Anonymizer."""
 
 import pytest
-import ruamel.yaml as yaml  # Import for ruamel.yaml usage
-from did.core.anonymizer import Anonymizer
+import spacy
+from did.core.anonymizer import Anonymizer, load_yaml, set_sentence_starts
 import sys
 import io
+import tempfile
 from contextlib import redirect_stdout, redirect_stderr
 
 
+@pytest.fixture(scope="session")
+def shared_anonymizers():
+    return {}
+
+
+@pytest.fixture
+def anonymizers(shared_anonymizers):
+    def get(language):
+        if language not in shared_anonymizers:
+            shared_anonymizers[language] = Anonymizer(language=language)
+        anonymizer = shared_anonymizers[language]
+        anonymizer.reset()
+        return anonymizer
+
+    return get
+
+
 @pytest.fixture
-def anonymizer():
-    return Anonymizer(language="en")
+def anonymizer(anonymizers):
+    return anonymizers("en")
 
 
 def test_extract_empty_text(anonymizer):
     anonymizer.detect_entities([""])
-    yaml_obj = yaml.YAML()  # Use ruamel.yaml YAML object
-    config_str = anonymizer.generate_yaml()
-    config = yaml_obj.load(config_str)  # Load from string
+    config = load_yaml(anonymizer.generate_yaml())
     assert config["PERSON"] == []
     assert config["EMAIL_ADDRESS"] == []
     assert config["LOCATION"] == []
@@ -29,27 +45,13 @@ def test_extract_empty_text(anonymizer):
     assert all(count == 0 for count in anonymizer.counts.values())
 
 
-def test_anonymize_name_exact(anonymizer):
-    text = "Hello John Doe, how are you?"
-    anonymizer.detect_entities([text])
-    anonymizer.load_replacements(
-        anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
-    )
-    result, counts = anonymizer.anonymize(text)
-    assert "<PERSON_1>" in result
-    assert counts["person_found"] >= 1
-    assert counts["person_replaced"] >= 1
-
-
 def test_anonymize_name_variants(anonymizer):
     text = "John Doe and Jon Doe and john DOE were mentioned."
     anonymizer.detect_entities([text])
     anonymizer.load_replacements(
         anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
     )
-    config_str = anonymizer.generate_yaml()
-    yaml_obj = yaml.YAML()
-    config = yaml_obj.load(config_str)
+    config = load_yaml(anonymizer.generate_yaml())
     assert len(config["PERSON"]) == 1
     result, counts = anonymizer.anonymize(text)
     assert "<PERSON_1>" in result
@@ -63,9 +65,7 @@ def test_anonymize_number_variants(anonymizer):
     anonymizer.load_replacements(
         anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
     )
-    config_str = anonymizer.generate_yaml()
-    yaml_obj = yaml.YAML()
-    config = yaml_obj.load(config_str)
+    config = load_yaml(anonymizer.generate_yaml())
     assert any(
         "1234567890" in entry["variants"]
         for entry in config.get("PHONE_NUMBER", []) + config.get("GENERAL_NUMBER", [])
@@ -79,61 +79,178 @@ def test_anonymize_number_variants(anonymizer):
     assert counts["phone_number_found"] + counts["general_number_found"] >= 3
 
 
-def test_anonymize_address(anonymizer):
-    text = "Lives at 123 Oneway St, Springfield, US"
+@pytest.mark.parametrize(
+    "language,text,tag,cat",
+    [
+        ("en", "Hello John Doe, how are you?", "<PERSON_1>", "person"),
+        ("en", "Lives at 123 Oneway St, Springfield, US", "<LOCATION_1>", "location"),
+        (
+            "da",
+            "Bor på Langelandsgade 14, 1.tv, 7300 Jelling",
+            "<LOCATION_1>",
+            "location",
+        ),
+        ("da", "CPR: 123456-1234", "<GENERAL_NUMBER_1>", "general_number"),
+    ],
+)
+def test_anonymize_entity(anonymizers, language, text, tag, cat):
+    anonymizer = anonymizers(language)
     anonymizer.detect_entities([text])
+    assert anonymizer.counts[f"{cat}_found"] >= 1
     anonymizer.load_replacements(
         anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
     )
     result, counts = anonymizer.anonymize(text)
-    assert "<LOCATION_1>" in result
-    assert counts["location_found"] >= 1
-    assert counts["location_replaced"] >= 1
+    assert tag in result
+    assert counts[f"{cat}_found"] >= 1
+    assert counts[f"{cat}_replaced"] >= 1
 
 
-def test_anonymize_danish_address():
-    anonymizer = Anonymizer(language="da")
-    text = "Bor på Langelandsgade 14, 1.tv, 7300 Jelling"
+def test_anonymize_mixed_content(anonymizer):
+    text = "Contact John Doe at 1234567890 or Jane Smith via 12 34 56 78. Jon Doe and Jane Smyth share details at 123 Oneway St, Springfield, US. CPR: 123456-1234. Additional phone: 1234567"
     anonymizer.detect_entities([text])
-    assert anonymizer.counts["location_found"] >= 1
     anonymizer.load_replacements(
         anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
     )
     result, counts = anonymizer.anonymize(text)
-    assert "<LOCATION_1>" in result
+    assert any(tag in result for tag in ["<PHONE_NUMBER_", "<GENERAL_NUMBER_"])
+    assert "<LOCATION_" in result
+    assert counts["person_found"] >= 4
+    assert counts["person_replaced"] >= 4
+    assert (
+        counts["phone_number_found"] + counts["general_number_found"] >= 4
+    )  # Including CPR as general
     assert counts["location_found"] >= 1
     assert counts["location_replaced"] >= 1
 
 
-def test_anonymize_cpr():
-    anonymizer = Anonymizer(language="da")
-    text = "CPR: 123456-1234"
+def test_phone_numbers_stay_on_one_line(anonymizer):
+    text = "Years:\n2019\n2020\n2021"
+    results = anonymizer.analyze_texts([text])[0]
+    assert not [r for r in results if r.entity_type == "PHONE_NUMBER"]
+
+
+def test_phone_number_keeps_leading_plus(anonymizer):
+    text = "call +45 12 34 56 78 now"
+    phones = [
+        text[r.start : r.end]
+        for r in anonymizer.analyze_texts([text])[0]
+        if r.entity_type == "PHONE_NUMBER"
+    ]
+    assert phones == ["+45 12 34 56 78"]
     anonymizer.detect_entities([text])
     anonymizer.load_replacements(
         anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
     )
-    result, counts = anonymizer.anonymize(text)
-    assert "<GENERAL_NUMBER_1>" in result
-    assert counts["general_number_found"] >= 1
-    assert counts["general_number_replaced"] >= 1
+    result, _ = anonymizer.anonymize(text)
+    assert result.startswith("call <") and result.endswith("> now")
+    assert "+" not in result
 
 
-def test_anonymize_mixed_content(anonymizer):
-    text = "Contact John Doe at 1234567890 or Jane Smith via 12 34 56 78. Jon Doe and Jane Smyth share details at 123 Oneway St, Springfield, US. CPR: 123456-1234. Additional phone: 1234567"
+def test_entities_stay_within_sentences(anonymizer):
+    text = "We met Jane Smith. John Doe arrived later. Springfield Council met."
+    nlp = anonymizer.analyzer.nlp_engine.nlp["en"]
+    assert len(list(nlp(text).sents)) == 3
+    for result in anonymizer.analyze_texts([text])[0]:
+        assert ". " not in text[result.start : result.end]
+
+
+def test_set_sentence_starts_prefers_senter():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("parser")
+    nlp.add_pipe("senter")
+    nlp.disable_pipe("senter")
+    set_sentence_starts(nlp)
+    assert nlp.pipe_names == ["senter"]
+    assert nlp.disabled == ["parser"]
+
+    blank = spacy.blank("en")
+    set_sentence_starts(blank)
+    assert blank.pipe_names == ["sentencizer"]
+
+
+def test_detect_entities_cached(tmp_path, monkeypatch):
+    anonymizer = Anonymizer(language="en", cache_dir=tmp_path)
+    text = "Contact John Doe at 1234567890"
     anonymizer.detect_entities([text])
+    first = anonymizer.generate_yaml()
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    cached = Anonymizer(language="en", cache_dir=tmp_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("analyzer should not run on a cache hit")
+
+    monkeypatch.setattr(cached.analyzer, "analyze", fail)
+    cached.detect_entities([text])
+    assert cached.generate_yaml() == first
+
+
+def test_analyze_cache_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr("did.core.anonymizer.ANALYZE_CACHE_MAX_ENTRIES", 1)
+    anonymizer = Anonymizer(language="en", cache_dir=tmp_path)
+    anonymizer.analyze_texts(["Contact John Doe", "Contact Jane Roe"])
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_detect_entities_memoized(monkeypatch):
+    anonymizer = Anonymizer(language="en")
+    text = "Contact John Doe at 1234567890"
+    first = anonymizer.analyze_texts([text])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("analyzer should not run for a memoized text")
+
+    monkeypatch.setattr(anonymizer.analyzer, "analyze", fail)
+    assert anonymizer.analyze_texts([text]) == first
+
+
+def test_anonymize_without_analyzer():
+    anonymizer = Anonymizer(language="en")
     anonymizer.load_replacements(
-        anonymizer.entities.model_dump(by_alias=True, exclude_none=True)
+        {"PERSON": [{"id": "<PERSON_1>", "variants": ["John Doe"]}]}
     )
-    result, counts = anonymizer.anonymize(text)
-    assert any(tag in result for tag in ["<PHONE_NUMBER_", "<GENERAL_NUMBER_"])
-    assert "<LOCATION_" in result
-    assert counts["person_found"] >= 4
-    assert counts["person_replaced"] >= 4
-    assert (
-        counts["phone_number_found"] + counts["general_number_found"] >= 4
-    )  # Including CPR as general
-    assert counts["location_found"] >= 1
-    assert counts["location_replaced"] >= 1
+    result, counts = anonymizer.anonymize("Hello John Doe")
+    assert result == "Hello <PERSON_1>"
+    assert counts["person_replaced"] == 1
+    assert "analyzer" not in vars(anonymizer)  # spaCy model never loaded
+
+
+def test_dump_yaml_matches_generate_yaml(anonymizer):
+    anonymizer.detect_entities(["Hello John Doe"])
+    stream = io.BytesIO()
+    anonymizer.dump_yaml(stream)
+    assert stream.getvalue().decode("utf-8") == anonymizer.generate_yaml()
+
+
+@pytest.mark.parametrize("mode", ["w", "w+b"])
+def test_dump_yaml_to_temporary_file(anonymizer, mode):
+    anonymizer.detect_entities(["Hello John Doe"])
+    with tempfile.NamedTemporaryFile(mode) as f:
+        anonymizer.dump_yaml(f)
+        f.flush()
+        with open(f.name, encoding="utf-8") as written:
+            assert written.read() == anonymizer.generate_yaml()
+
+
+def test_dump_yaml_to_plain_text_writer(anonymizer):
+    class Writer:
+        def __init__(self):
+            self.parts = []
+
+        def write(self, text):
+            self.parts.append(text + "")  # Fails on bytes
+
+    anonymizer.detect_entities(["Hello John Doe"])
+    writer = Writer()
+    anonymizer.dump_yaml(writer)
+    assert "".join(writer.parts) == anonymizer.generate_yaml()
+
+
+def test_generate_json_loads_as_yaml(anonymizer):
+    anonymizer.detect_entities(["Hello John Doe"])
+    config = load_yaml(anonymizer.generate_json())
+    assert config == load_yaml(anonymizer.generate_yaml())
 
 
 def test_cli_extract(tmp_path):
@@ -142,7 +259,14 @@ def test_cli_extract(tmp_path):
     input_file.write_text("Hello John Doe and Jon Doe, CPR: 123456-1234")
 
     old_argv = sys.argv
-    sys.argv = ["did", "extract", str(input_file), "--config", str(config_file)]
+    sys.argv = [
+        "did",
+        "extract",
+        str(input_file),
+        "--config",
+        str(config_file),
+        "--no-cache",
+    ]
 
     from did.cli import main
 
@@ -158,9 +282,8 @@ def test_cli_extract(tmp_path):
 
     assert "PERSON found: 2" in output  # Grouped
     assert config_file.exists()
-    yaml_obj = yaml.YAML()  # Use ruamel.yaml YAML object
     with open(config_file, "r") as f:
-        config = yaml_obj.load(f)  # Load using YAML object
+        config = load_yaml(f)
         assert len(config["PERSON"]) >= 1
         assert any(
             "123456-1234" in entry["variants"]
@@ -176,18 +299,21 @@ def test_cli_anonymize(tmp_path):
     original_text = "Hello John Doe and Jon Doe, CPR: 123456-1234"
     input_file.write_text(original_text)
 
-    # First extract to generate config
-    old_argv = sys.argv
-    sys.argv = ["did", "extract", str(input_file), "--config", str(config_file)]
-    from did.cli import main
+    # First extract to generate config; test_cli_extract covers argument
+    # parsing, so the command callback is called directly here
+    from did.cli import extract, main
 
     with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
-        try:
-            main()
-        except SystemExit as e:
-            if e.code != 0:
-                raise
-    sys.argv = old_argv
+        extract(
+            [str(input_file)],
+            str(config_file),
+            language="en",
+            no_cache=True,
+            jobs=1,
+            model=None,
+            device="auto",
+        )
+    old_argv = sys.argv
 
     # Modify the input file to add new content
     modified_text = (
@@ -223,3 +349,25 @@ def test_cli_anonymize(tmp_path):
         assert "Alice" in content
         assert "987654-4321" in content
         assert content.count("<PERSON_1>") == 3  # Variants of John Doe
+
+
+def test_load_yaml_keeps_plain_scalars_as_strings():
+    config = load_yaml("variants: [yes, 012, 12:30, 2020-01-01, 1.5]\npattern:")
+    assert config == {
+        "variants": ["yes", "012", "12:30", "2020-01-01", "1.5"],
+        "pattern": None,
+    }
+
+
+def test_anonymize_variant_in_two_categories():
+    anonymizer = Anonymizer(language="en")
+    anonymizer.load_replacements(
+        {
+            "PERSON": [{"id": "<PERSON_1>", "variants": ["Jelling"]}],
+            "LOCATION": [{"id": "<LOCATION_1>", "variants": ["Jelling"]}],
+        }
+    )
+    result, counts = anonymizer.anonymize("Jelling lives on Jellingvej")
+    assert result == "<PERSON_1> lives on <LOCATION_1>vej"
+    assert counts["person_replaced"] == 1
+    assert counts["location_found"] == counts["location_replaced"] == 1
@@ -1,12 +1,20 @@
 """Tests for file_utils."""
 
 import pytest
-from did.file_utils import extract_text, anonymize_file, md_to_typst
+from did.file_utils import (
+    extract_text,
+    anonymize_file,
+    anonymize_files,
+    md_to_typst,
+    write_text_atomic,
+)
 from did.core.anonymizer import Anonymizer
 
 
-@pytest.fixture
-def temp_files(tmp_path):
+@pytest.fixture(scope="session")
+def temp_files(tmp_path_factory):
+    # Inputs are only read, so one set is shared; outputs go to each tmp_path
+    tmp_path = tmp_path_factory.mktemp("inputs")
     md_file = tmp_path / "test.md"
     md_file.write_text("# Heading\n**Bold** text")
     txt_file = tmp_path / "test.txt"
@@ -42,6 +50,14 @@ def test_extract_text_tex(temp_files):
     assert "\\documentclass" not in text
 
 
+def test_extract_text_tex_commands(tmp_path):
+    tex_file = tmp_path / "commands.tex"
+    tex_file.write_text(
+        "\\section{Intro} Hello \\emph{Jane}\\,Doe\n\\begin{x}y\\end{x} end"
+    )
+    assert extract_text(tex_file) == "Hello \\,Doe y end"
+
+
 def test_extract_text_bib(temp_files):
     _, _, _, bib_file = temp_files
     text = extract_text(bib_file)
@@ -56,44 +72,44 @@ def test_extract_text_unsupported(tmp_path):
         extract_text(unsupported)
 
 
-def test_anonymize_file_md(temp_files):
+def test_anonymize_file_md(temp_files, tmp_path):
     md_file, _, _, _ = temp_files
     anonymizer = Anonymizer(language="en")
     anonymizer.detect_entities([extract_text(md_file)])
-    output = md_file.with_stem("output")
+    output = tmp_path / "output.md"
     counts = anonymize_file(md_file, anonymizer, output)
     assert output.exists()
     assert counts["person_found"] == 0  # No persons in sample
     assert counts["person_replaced"] == 0
 
 
-def test_anonymize_file_txt(temp_files):
+def test_anonymize_file_txt(temp_files, tmp_path):
     _, txt_file, _, _ = temp_files
     anonymizer = Anonymizer(language="en")
     anonymizer.detect_entities([extract_text(txt_file)])
-    output = txt_file.with_stem("output")
+    output = tmp_path / "output.txt"
     counts = anonymize_file(txt_file, anonymizer, output)
     assert output.exists()
     assert counts["person_found"] == 0
     assert counts["person_replaced"] == 0
 
 
-def test_anonymize_file_tex(temp_files):
+def test_anonymize_file_tex(temp_files, tmp_path):
     _, _, tex_file, _ = temp_files
     anonymizer = Anonymizer(language="en")
     anonymizer.detect_entities([extract_text(tex_file)])
-    output = tex_file.with_stem("output")
+    output = tmp_path / "output.tex"
     counts = anonymize_file(tex_file, anonymizer, output)
     assert output.exists()
     assert counts["person_found"] == 0
     assert counts["person_replaced"] == 0
 
 
-def test_anonymize_file_bib(temp_files):
+def test_anonymize_file_bib(temp_files, tmp_path):
     _, _, _, bib_file = temp_files
     anonymizer = Anonymizer(language="en")
     anonymizer.detect_entities([extract_text(bib_file)])
-    output = bib_file.with_stem("output")
+    output = tmp_path / "output.bib"
     counts = anonymize_file(bib_file, anonymizer, output)
     assert output.exists()
     with open(output, "r") as f:
@@ -111,6 +127,19 @@ def test_anonymize_file_unsupported(tmp_path):
         anonymize_file(unsupported, anonymizer, output)
 
 
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_anonymize_files(tmp_path, max_workers):
+    inputs = [tmp_path / "a.md", tmp_path / "b.txt"]
+    inputs[0].write_text("John Doe wrote this")
+    inputs[1].write_text("Ask John Doe or J. Doe")
+    outputs = [p.with_stem(p.stem + "_anon") for p in inputs]
+    config = {"PERSON": [{"id": "<PERSON_1>", "variants": ["John Doe", "J. Doe"]}]}
+    counts = anonymize_files(inputs, config, outputs, max_workers=max_workers)
+    assert outputs[0].read_text() == "<PERSON_1> wrote this"
+    assert outputs[1].read_text() == "Ask <PERSON_1> or <PERSON_1>"
+    assert counts["person_replaced"] == 3
+
+
 def test_md_to_typst():
     md = "# Heading\n**Bold** _italic_ `code` [link](url)"
     typst = md_to_typst(md)
@@ -119,3 +148,11 @@ def test_md_to_typst():
     assert "_italic_" in typst
     assert "`code`" in typst
     assert '#link("url")[link]' in typst
+
+
+def test_write_text_atomic(tmp_path):
+    target = tmp_path / "out.md"
+    target.write_text("old")
+    write_text_atomic(target, "new æøå")
+    assert target.read_text(encoding="utf-8") == "new æøå"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.md"]